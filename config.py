@@ -5,8 +5,13 @@ BASE_DIR = Path(__file__).parent
 
 # BLE settings
 SCALE_NAME = "tzc"
+# The manufacturer ID varies between units and firmware (0x88C0, 0xA6C0 and
+# 0x74C0 have been seen), so scanning filters by SCALE_NAME instead.
 MANUFACTURER_ID = 0x88C0
 
+# ETL: how often the dashboard processes new raw packets in the background
+ETL_INTERVAL_SECONDS = 60
+
 # Database (stored alongside code)
 DATABASE_PATH = BASE_DIR / "measurements.db"
 
@@ -1,45 +1,103 @@
 """Flask dashboard for scale measurements."""
 
+import threading
+import time
+
+import orjson
 from flask import Flask, jsonify, render_template, request
+from flask_caching import Cache
 
 import db
-from config import BASE_DIR, DASHBOARD_HOST, DASHBOARD_PORT
+from config import BASE_DIR, DASHBOARD_HOST, DASHBOARD_PORT, ETL_INTERVAL_SECONDS
 from etl import run_etl
 
 app = Flask(__name__, template_folder=BASE_DIR / "templates")
 
+# In-process cache; cleared whenever measurements or profiles change
+cache = Cache(app, config={"CACHE_TYPE": "SimpleCache"})
+
+
+@app.teardown_appcontext
+def rollback_on_error(exception: BaseException | None) -> None:
+    """Discard any half-finished transaction left by a failed request."""
+    if exception is not None:
+        db.rollback()
+
+
+@app.after_request
+def invalidate_cache(response):
+    """Drop cached reads after any successful write request."""
+    if request.method != "GET" and response.status_code < 400:
+        cache.clear()
+    return response
+
+
+# Minimum seconds between ETL runs triggered by page loads
+ETL_DEBOUNCE_SECONDS = 5
+
+_etl_lock = threading.Lock()
+_last_etl = 0.0
+
+
+def run_etl_once(blocking: bool = False) -> dict | None:
+    """Run ETL under a lock. Returns stats, or None if a run was already in progress."""
+    global _last_etl
+    if not _etl_lock.acquire(blocking=blocking):
+        return None
+    try:
+        stats = run_etl()
+        if stats["measurements"] or stats["updated"]:
+            cache.clear()
+        return stats
+    finally:
+        _last_etl = time.monotonic()
+        _etl_lock.release()
+
+
+def _etl_loop() -> None:
+    """Process new packets periodically, off the request path."""
+    while True:
+        try:
+            run_etl_once()
+        except Exception:
+            app.logger.exception("Background ETL failed")
+        time.sleep(ETL_INTERVAL_SECONDS)
+
 
 @app.route("/")
 def index():
     """Render the dashboard."""
-    run_etl()  # Process any new packets
-
-    profiles = db.get_profiles()
+    # Kick off ETL in the background; new packets show up on the next load
+    if time.monotonic() - _last_etl > ETL_DEBOUNCE_SECONDS:
+        threading.Thread(target=run_etl_once, daemon=True).start()
 
     # Get profile filter from query param, default to first profile
     profile_param = request.args.get("profile")
-    if profile_param and profile_param.isdigit():
-        profile_id = int(profile_param)
-    elif profiles:
-        profile_id = profiles[0]["id"]
-    else:
-        profile_id = None
+    profile_id = int(profile_param) if profile_param and profile_param.isdigit() else None
+
+    return render_index(profile_id)
+
 
-    latest = db.get_latest_measurement(profile_id=profile_id)
-    recent = db.get_measurements(limit=10, profile_id=profile_id)
+@cache.memoize(timeout=300)
+def render_index(profile_id: int | None) -> str:
+    """Render the dashboard HTML for a profile (cached until data changes)."""
+    profile_id, latest, recent, profiles = db.get_dashboard_bundle(profile_id, limit=10)
+    profile_names = {p["id"]: p["name"] for p in profiles}
 
     return render_template(
         "index.html",
         latest=latest,
         recent=recent,
         profiles=profiles,
+        profile_names=profile_names,
         selected_profile=profile_id,
     )
 
 
 @app.route("/api/chart-data")
+@cache.cached(timeout=60, query_string=True)
 def chart_data():
-    """Return chart data as JSON."""
+    """Return daily-averaged chart data as JSON."""
     profile_param = request.args.get("profile")
     if profile_param and profile_param.isdigit():
         profile_id = int(profile_param)
@@ -47,21 +105,29 @@ def chart_data():
         profiles = db.get_profiles()
         profile_id = profiles[0]["id"] if profiles else None
 
-    measurements = db.get_measurements_since(days=30, profile_id=profile_id)
-    return jsonify(
-        {
-            "weights": [{"x": m["timestamp"], "y": m["weight_kg"]} for m in measurements],
-            "body_fat": [{"x": m["timestamp"], "y": m["body_fat_pct"]} for m in measurements],
-        }
+    labels, weights, body_fat = db.get_chart_points_since(days=30, profile_id=profile_id)
+    return app.response_class(
+        orjson.dumps(
+            {"labels": labels, "weights": weights, "body_fat": body_fat},
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        ),
+        mimetype="application/json",
     )
 
 
+@app.route("/etl", methods=["POST"])
+def trigger_etl():
+    """Process new packets now and return ETL stats."""
+    return jsonify(run_etl_once(blocking=True))
+
+
 # Profile API routes
 @app.route("/api/profiles", methods=["GET"])
+@cache.cached(timeout=300)
 def list_profiles():
     """Return list of profiles."""
     profiles = db.get_profiles()
-    return jsonify(profiles)
+    return jsonify([dict(p) for p in profiles])
 
 
 @app.route("/api/profiles", methods=["POST"])
@@ -88,7 +154,7 @@ def get_profile(profile_id: int):
     profile = db.get_profile(profile_id)
     if not profile:
         return jsonify({"error": "Profile not found"}), 404
-    return jsonify(profile)
+    return jsonify(dict(profile))
 
 
 @app.route("/api/profiles/<int:profile_id>", methods=["PUT"])
@@ -128,6 +194,7 @@ def delete_profile_route(profile_id: int):
 
 # HTMX partial routes
 @app.route("/partials/profiles")
+@cache.cached(timeout=300)
 def partials_profiles():
     """Render profiles list partial."""
     profiles = db.get_profiles()
@@ -183,6 +250,6 @@ def partials_delete_profile(profile_id: int):
 
 
 if __name__ == "__main__":
-    db.migrate_db()  # Run migrations first for existing databases
-    db.init_db()
+    db.init_db()  # Also migrates existing databases
+    threading.Thread(target=_etl_loop, daemon=True).start()
     app.run(host=DASHBOARD_HOST, port=DASHBOARD_PORT, debug=False)
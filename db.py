@@ -1,33 +1,116 @@
-"""SQLite database for scale measurements."""
+"""SQLite database for scale measurements.
 
+Tuning: every connection runs in WAL mode with synchronous=NORMAL, in-memory
+temp storage, a 64 MB page cache and up to 512 MB of memory-mapped I/O.
+New database files get 8 KB pages; files created with the old 4 KB default
+are converted by a one-off VACUUM in init_db() when no other process has the
+database open.
+"""
+
+import logging
 import sqlite3
+import threading
 from contextlib import contextmanager
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Iterator
 
+import numpy as np
+
 from config import DATABASE_PATH
 
+log = logging.getLogger(__name__)
+
+# One connection for the whole process; re-entrant so helpers can nest
+_lock = threading.RLock()
+_conn: sqlite3.Connection | None = None
+
+PAGE_SIZE = 8192
+
+# Bump when migrate_db() gains a step; stored in PRAGMA user_version
+SCHEMA_VERSION = 4
+
+
+def tune(conn: sqlite3.Connection) -> None:
+    """Apply the per-connection PRAGMAs described in the module docstring."""
+    conn.executescript(f"""
+        PRAGMA page_size={PAGE_SIZE};  -- Only takes effect on a new, empty file
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-64000;
+        PRAGMA mmap_size=536870912;
+        PRAGMA wal_autocheckpoint=1000;
+    """)
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a new connection and tune it once."""
+    # Opened once per process and shared by the scanner, ETL and every
+    # dashboard request, so a larger statement cache stays warm across them
+    conn = sqlite3.connect(DATABASE_PATH, cached_statements=256, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    tune(conn)
+    return conn
+
 
 @contextmanager
 def get_connection() -> Iterator[sqlite3.Connection]:
-    """Context manager for database connections."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")  # Non-blocking reads
-    try:
-        yield conn
-    finally:
-        conn.close()
+    """Context manager yielding the process-wide database connection.
+
+    The connection is opened lazily and shared by every thread (the threaded
+    dashboard server starts one per request). The lock is held for the whole
+    block, so a thread's transaction is never interleaved with another's.
+    Uncommitted changes are rolled back if the block raises.
+    """
+    global _conn
+    with _lock:
+        if _conn is None:
+            _conn = _connect()
+        try:
+            yield _conn
+        except BaseException:
+            _conn.rollback()
+            raise
+
+
+def rollback() -> None:
+    """Roll back any open transaction on the shared connection."""
+    with _lock:
+        if _conn is not None and _conn.in_transaction:
+            _conn.rollback()
+
+
+def close_connection() -> None:
+    """Close the shared connection, if any."""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+def _schema_has(conn: sqlite3.Connection, kind: str, name: str) -> bool:
+    """Check whether a table/index/trigger exists."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?", (kind, name)
+    ).fetchone() is not None
+
+
+# Milliseconds since the Unix epoch, derived from the ISO timestamp column.
+# Virtual, so existing rows need no backfill; indexed for range and order queries.
+TS_MS_SQL = "CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER)"
+_TS_MS_COLUMN = f"ts_ms INTEGER GENERATED ALWAYS AS ({TS_MS_SQL}) VIRTUAL"
 
 
 def init_db() -> None:
-    """Initialize database with schema."""
+    """Initialize database with schema, migrating older databases as needed."""
     with get_connection() as conn:
-        conn.executescript("""
+        conn.executescript(f"""
             CREATE TABLE IF NOT EXISTS raw_packets (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                packet_hex TEXT NOT NULL
+                mfg_id INTEGER NOT NULL,
+                data BLOB NOT NULL
             );
 
             CREATE TABLE IF NOT EXISTS profiles (
@@ -55,26 +138,169 @@ def init_db() -> None:
                 bone_mass_kg REAL,
                 bmr_kcal INTEGER,
                 bmi REAL,
+                {_TS_MS_COLUMN},
                 FOREIGN KEY (profile_id) REFERENCES profiles(id)
             );
+        """)
 
-            CREATE INDEX IF NOT EXISTS idx_measurements_timestamp
-            ON measurements(timestamp);
+    # Bring older databases up to the current columns before indexing them
+    migrate_db()
 
-            CREATE INDEX IF NOT EXISTS idx_measurements_profile_id
-            ON measurements(profile_id);
+    with get_connection() as conn:
+        new_index = not _schema_has(conn, "index", "idx_measurements_ts_imp")
+        conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_measurements_ts_ms
+            ON measurements(ts_ms);
+
+            -- Covers the ETL's existing-measurement scan (id is the rowid).
+            -- Keyed on the stored timestamp: SQLite never treats an index
+            -- containing a virtual column such as ts_ms as covering.
+            CREATE INDEX IF NOT EXISTS idx_measurements_ts_imp
+            ON measurements(timestamp, impedance_ohm, profile_id);
+
+            -- Serves per-profile filtering and newest-first ordering together
+            CREATE INDEX IF NOT EXISTS idx_measurements_profile_ts_ms
+            ON measurements(profile_id, ts_ms DESC);
+
+            DROP INDEX IF EXISTS idx_measurements_timestamp;
+            DROP INDEX IF EXISTS idx_measurements_profile_id;
+            DROP INDEX IF EXISTS idx_measurements_profile_ts;
         """)
+        if new_index:
+            conn.execute("ANALYZE")  # Let the planner pick up the new indexes
         conn.commit()
 
+        if conn.execute("PRAGMA page_size").fetchone()[0] != PAGE_SIZE:
+            _rebuild_page_size(conn)
+
+
+def _rebuild_page_size(conn: sqlite3.Connection) -> None:
+    """Rewrite the database file with PAGE_SIZE pages.
+
+    A WAL database cannot change page size, so this briefly switches to a
+    rollback journal. Skipped if another process holds the database; it is
+    retried on the next start.
+    """
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+        conn.execute("VACUUM")
+    except sqlite3.OperationalError as e:
+        log.warning("Skipping conversion to %d-byte pages, retrying next start: %s", PAGE_SIZE, e)
+
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError as e:
+        # Connections opened later switch back to WAL in tune()
+        log.warning("Could not switch back to WAL mode: %s", e)
+
+
+# Per-day running sums for the chart, kept in sync by triggers.
+# profile_id 0 collects measurements without a profile.
+_DAILY_AGGREGATES = (
+    """
+    CREATE TABLE IF NOT EXISTS measurements_daily (
+        date TEXT NOT NULL,
+        profile_id INTEGER NOT NULL,
+        measurement_count INTEGER NOT NULL,
+        weight_sum REAL NOT NULL,
+        body_fat_count INTEGER NOT NULL,
+        body_fat_sum REAL NOT NULL,
+        PRIMARY KEY (date, profile_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS measurements_daily_insert
+    AFTER INSERT ON measurements
+    BEGIN
+        INSERT INTO measurements_daily VALUES (
+            date(NEW.timestamp), COALESCE(NEW.profile_id, 0), 1, NEW.weight_kg,
+            NEW.body_fat_pct IS NOT NULL, COALESCE(NEW.body_fat_pct, 0)
+        )
+        ON CONFLICT (date, profile_id) DO UPDATE SET
+            measurement_count = measurement_count + 1,
+            weight_sum = weight_sum + excluded.weight_sum,
+            body_fat_count = body_fat_count + excluded.body_fat_count,
+            body_fat_sum = body_fat_sum + excluded.body_fat_sum;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS measurements_daily_delete
+    AFTER DELETE ON measurements
+    BEGIN
+        UPDATE measurements_daily SET
+            measurement_count = measurement_count - 1,
+            weight_sum = weight_sum - OLD.weight_kg,
+            body_fat_count = body_fat_count - (OLD.body_fat_pct IS NOT NULL),
+            body_fat_sum = body_fat_sum - COALESCE(OLD.body_fat_pct, 0)
+        WHERE date = date(OLD.timestamp) AND profile_id = COALESCE(OLD.profile_id, 0);
+        DELETE FROM measurements_daily
+        WHERE date = date(OLD.timestamp) AND profile_id = COALESCE(OLD.profile_id, 0)
+            AND measurement_count <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS measurements_daily_update
+    AFTER UPDATE OF timestamp, profile_id, weight_kg, body_fat_pct ON measurements
+    BEGIN
+        UPDATE measurements_daily SET
+            measurement_count = measurement_count - 1,
+            weight_sum = weight_sum - OLD.weight_kg,
+            body_fat_count = body_fat_count - (OLD.body_fat_pct IS NOT NULL),
+            body_fat_sum = body_fat_sum - COALESCE(OLD.body_fat_pct, 0)
+        WHERE date = date(OLD.timestamp) AND profile_id = COALESCE(OLD.profile_id, 0);
+        DELETE FROM measurements_daily
+        WHERE date = date(OLD.timestamp) AND profile_id = COALESCE(OLD.profile_id, 0)
+            AND measurement_count <= 0;
+        INSERT INTO measurements_daily VALUES (
+            date(NEW.timestamp), COALESCE(NEW.profile_id, 0), 1, NEW.weight_kg,
+            NEW.body_fat_pct IS NOT NULL, COALESCE(NEW.body_fat_pct, 0)
+        )
+        ON CONFLICT (date, profile_id) DO UPDATE SET
+            measurement_count = measurement_count + 1,
+            weight_sum = weight_sum + excluded.weight_sum,
+            body_fat_count = body_fat_count + excluded.body_fat_count,
+            body_fat_sum = body_fat_sum + excluded.body_fat_sum;
+    END
+    """,
+)
+
+
+def _create_daily_aggregates(conn: sqlite3.Connection) -> None:
+    """Create measurements_daily and its triggers, then backfill existing measurements.
+
+    Statements run one by one (not executescript) so they stay inside the
+    caller's transaction.
+    """
+    for statement in _DAILY_AGGREGATES:
+        conn.execute(statement)
+    conn.execute("""
+        INSERT INTO measurements_daily
+        SELECT date(timestamp), COALESCE(profile_id, 0), COUNT(*), SUM(weight_kg),
+            COUNT(body_fat_pct), TOTAL(body_fat_pct)
+        FROM measurements
+        GROUP BY 1, 2
+    """)
+
 
 def migrate_db() -> None:
-    """Run database migrations for existing databases."""
+    """Run database migrations for existing databases.
+
+    Already-migrated databases are detected via PRAGMA user_version and
+    skipped; otherwise all steps run in one IMMEDIATE transaction.
+    """
     with get_connection() as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        # Another process may have migrated while we waited for the lock
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            conn.rollback()
+            return
+
         # Check if profiles table exists
-        cursor = conn.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='profiles'"
-        )
-        if not cursor.fetchone():
+        if not _schema_has(conn, "table", "profiles"):
             conn.execute("""
                 CREATE TABLE profiles (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -95,35 +321,68 @@ def migrate_db() -> None:
         if "max_weight_kg" not in columns:
             conn.execute("ALTER TABLE profiles ADD COLUMN max_weight_kg REAL")
 
-        # Check if profile_id column exists in measurements
-        cursor = conn.execute("PRAGMA table_info(measurements)")
+        # Check for columns added to measurements (table_xinfo includes generated ones)
+        cursor = conn.execute("PRAGMA table_xinfo(measurements)")
         columns = {row[1] for row in cursor.fetchall()}
         if "profile_id" not in columns:
             conn.execute("ALTER TABLE measurements ADD COLUMN profile_id INTEGER")
-            conn.execute(
-                "CREATE INDEX IF NOT EXISTS idx_measurements_profile_id ON measurements(profile_id)"
-            )
+        if "ts_ms" not in columns:
+            conn.execute(f"ALTER TABLE measurements ADD COLUMN {_TS_MS_COLUMN}")
+
+        # Raw packets used to be stored as 'mfgid:hexdata' text
+        cursor = conn.execute("PRAGMA table_info(raw_packets)")
+        if "packet_hex" in {row[1] for row in cursor.fetchall()}:
+            _migrate_raw_packets(conn)
 
+        # Checked under the write lock, so the backfill runs exactly once
+        if not _schema_has(conn, "table", "measurements_daily"):
+            _create_daily_aggregates(conn)
+
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
 
 
+def _migrate_raw_packets(conn: sqlite3.Connection) -> None:
+    """Rebuild raw_packets with the manufacturer id and data split out of packet_hex."""
+    conn.execute("""
+        CREATE TABLE raw_packets_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            mfg_id INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    rows = conn.execute("SELECT id, timestamp, packet_hex FROM raw_packets")
+    converted = []
+    for packet_id, timestamp, packet_hex in rows:
+        try:
+            mfg_id_hex, data_hex = packet_hex.split(":")
+            converted.append((packet_id, timestamp, int(mfg_id_hex, 16), bytes.fromhex(data_hex)))
+        except (ValueError, AttributeError):
+            continue  # Unparseable packets were always skipped by the ETL
+    conn.executemany(
+        "INSERT INTO raw_packets_new (id, timestamp, mfg_id, data) VALUES (?, ?, ?, ?)",
+        converted,
+    )
+    conn.execute("DROP TABLE raw_packets")
+    conn.execute("ALTER TABLE raw_packets_new RENAME TO raw_packets")
+
+
 # Profile CRUD functions
-def get_profiles() -> list[dict]:
+def get_profiles() -> list[sqlite3.Row]:
     """Get all profiles."""
     with get_connection() as conn:
-        rows = conn.execute(
+        return conn.execute(
             "SELECT * FROM profiles ORDER BY id"
         ).fetchall()
-        return [dict(row) for row in rows]
 
 
-def get_profile(profile_id: int) -> dict | None:
+def get_profile(profile_id: int) -> sqlite3.Row | None:
     """Get a single profile by ID."""
     with get_connection() as conn:
-        row = conn.execute(
+        return conn.execute(
             "SELECT * FROM profiles WHERE id = ?", (profile_id,)
         ).fetchone()
-        return dict(row) if row else None
 
 
 def save_profile(
@@ -136,7 +395,7 @@ def save_profile(
     profile_id: int | None = None,
 ) -> int:
     """Create or update a profile. Returns the profile ID."""
-    with get_connection() as conn:
+    with get_connection() as conn, conn:
         if profile_id:
             conn.execute(
                 """
@@ -146,7 +405,6 @@ def save_profile(
                 """,
                 (name, min_weight_kg, max_weight_kg, height_cm, age, gender, profile_id),
             )
-            conn.commit()
             return profile_id
         else:
             cursor = conn.execute(
@@ -156,28 +414,38 @@ def save_profile(
                 """,
                 (name, min_weight_kg, max_weight_kg, height_cm, age, gender),
             )
-            conn.commit()
             return cursor.lastrowid or 0
 
 
 def delete_profile(profile_id: int) -> None:
     """Delete a profile."""
-    with get_connection() as conn:
+    with get_connection() as conn, conn:
         conn.execute("DELETE FROM profiles WHERE id = ?", (profile_id,))
-        conn.commit()
 
 
-def save_raw_packet(packet_hex: str) -> int:
+def save_raw_packet(mfg_id: int, data: bytes) -> int:
     """Save raw packet data and return the row ID."""
-    with get_connection() as conn:
+    with get_connection() as conn, conn:
         cursor = conn.execute(
-            "INSERT INTO raw_packets (packet_hex) VALUES (?)",
-            (packet_hex,),
+            "INSERT INTO raw_packets (mfg_id, data) VALUES (?, ?)",
+            (mfg_id, data),
         )
-        conn.commit()
         return cursor.lastrowid or 0
 
 
+def save_raw_packets_bulk(rows: list[tuple[str, int, bytes]]) -> None:
+    """Save many raw packets in one transaction.
+
+    Each row is (timestamp, mfg_id, data), with timestamp in SQLite's
+    CURRENT_TIMESTAMP format ('YYYY-MM-DD HH:MM:SS', UTC).
+    """
+    with get_connection() as conn, conn:
+        conn.executemany(
+            "INSERT INTO raw_packets (timestamp, mfg_id, data) VALUES (?, ?, ?)",
+            rows,
+        )
+
+
 def save_measurement(
     weight_kg: float,
     impedance_raw: int | None = None,
@@ -192,7 +460,7 @@ def save_measurement(
     bmi: float | None = None,
 ) -> int:
     """Save a measurement and return the row ID."""
-    with get_connection() as conn:
+    with get_connection() as conn, conn:
         cursor = conn.execute(
             """
             INSERT INTO measurements (
@@ -215,97 +483,150 @@ def save_measurement(
                 bmi,
             ),
         )
-        conn.commit()
         return cursor.lastrowid or 0
 
 
-def get_latest_measurement(profile_id: int | None = None) -> dict | None:
+def save_measurements_bulk(rows: list[tuple], updates: list[tuple] = ()) -> None:
+    """Save many new measurements and update existing ones in one transaction.
+
+    Each row is (timestamp, profile_id, weight_kg, impedance_raw,
+    impedance_ohm, body_fat_pct, fat_mass_kg, lean_mass_kg, body_water_pct,
+    muscle_mass_kg, bone_mass_kg, bmr_kcal, bmi). Each update is the same
+    without the timestamp, followed by the id of the measurement to overwrite.
+    """
+    with get_connection() as conn, conn:
+        conn.executemany(
+            """
+            UPDATE measurements SET
+                profile_id = ?, weight_kg = ?, impedance_raw = ?, impedance_ohm = ?,
+                body_fat_pct = ?, fat_mass_kg = ?, lean_mass_kg = ?, body_water_pct = ?,
+                muscle_mass_kg = ?, bone_mass_kg = ?, bmr_kcal = ?, bmi = ?
+            WHERE id = ?
+            """,
+            updates,
+        )
+        conn.executemany(
+            """
+            INSERT INTO measurements (
+                timestamp, profile_id, weight_kg, impedance_raw, impedance_ohm,
+                body_fat_pct, fat_mass_kg, lean_mass_kg, body_water_pct,
+                muscle_mass_kg, bone_mass_kg, bmr_kcal, bmi
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+
+
+def _profile_filter(profile_id: int | None) -> tuple[str, tuple]:
+    """SQL condition and params restricting measurements `m` to one profile.
+
+    Kept as two statement texts rather than `?1 IS NULL OR ...` so SQLite can
+    still plan the filtered case against idx_measurements_profile_ts_ms.
+    """
+    if profile_id is None:
+        return "1", ()
+    return "m.profile_id = ?", (profile_id,)
+
+
+def _recent_measurements(
+    conn: sqlite3.Connection, limit: int, profile_id: int | None
+) -> list[sqlite3.Row]:
+    """Query recent measurements, newest first, on an open connection.
+
+    Rows also carry display-ready timestamp_utc and timestamp_minute strings.
+    """
+    condition, params = _profile_filter(profile_id)
+    return conn.execute(
+        f"""
+        SELECT m.*,
+            substr(m.timestamp, 1, 19) AS timestamp_utc,
+            substr(m.timestamp, 1, 16) AS timestamp_minute
+        FROM measurements m
+        WHERE {condition}
+        ORDER BY m.ts_ms DESC LIMIT ?
+        """,
+        (*params, limit),
+    ).fetchall()
+
+
+def get_latest_measurement(profile_id: int | None = None) -> sqlite3.Row | None:
     """Get the most recent measurement, optionally filtered by profile."""
-    with get_connection() as conn:
-        if profile_id is not None:
-            row = conn.execute(
-                """
-                SELECT m.*, p.name as profile_name
-                FROM measurements m
-                LEFT JOIN profiles p ON m.profile_id = p.id
-                WHERE m.profile_id = ?
-                ORDER BY m.timestamp DESC LIMIT 1
-                """,
-                (profile_id,),
-            ).fetchone()
-        else:
-            row = conn.execute(
-                """
-                SELECT m.*, p.name as profile_name
-                FROM measurements m
-                LEFT JOIN profiles p ON m.profile_id = p.id
-                ORDER BY m.timestamp DESC LIMIT 1
-                """
-            ).fetchone()
-        return dict(row) if row else None
+    rows = get_measurements(limit=1, profile_id=profile_id)
+    return rows[0] if rows else None
 
 
-def get_measurements(limit: int = 10, profile_id: int | None = None) -> list[dict]:
+def get_measurements(limit: int = 10, profile_id: int | None = None) -> list[sqlite3.Row]:
     """Get recent measurements, newest first, optionally filtered by profile."""
     with get_connection() as conn:
-        if profile_id is not None:
-            rows = conn.execute(
-                """
-                SELECT m.*, p.name as profile_name
-                FROM measurements m
-                LEFT JOIN profiles p ON m.profile_id = p.id
-                WHERE m.profile_id = ?
-                ORDER BY m.timestamp DESC LIMIT ?
-                """,
-                (profile_id, limit),
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                """
-                SELECT m.*, p.name as profile_name
-                FROM measurements m
-                LEFT JOIN profiles p ON m.profile_id = p.id
-                ORDER BY m.timestamp DESC LIMIT ?
-                """,
-                (limit,),
-            ).fetchall()
-        return [dict(row) for row in rows]
+        return _recent_measurements(conn, limit, profile_id)
+
+
+def get_dashboard_bundle(
+    profile_id: int | None = None, limit: int = 10
+) -> tuple[int | None, sqlite3.Row | None, list[sqlite3.Row], list[sqlite3.Row]]:
+    """Get everything the dashboard page needs in one pass.
+
+    Falls back to the first profile when profile_id is None.
+    Returns (profile_id, latest, recent, profiles).
+    """
+    with get_connection() as conn:
+        profiles = conn.execute("SELECT * FROM profiles ORDER BY id").fetchall()
+        if profile_id is None and profiles:
+            profile_id = profiles[0]["id"]
+        recent = _recent_measurements(conn, limit, profile_id)
+    return profile_id, (recent[0] if recent else None), recent, profiles
 
 
-def get_measurements_since(days: int = 30, profile_id: int | None = None) -> list[dict]:
+def get_measurements_since(
+    days: int = 30, profile_id: int | None = None
+) -> list[sqlite3.Row]:
     """Get measurements from the last N days, oldest first (for charting)."""
-    cutoff = datetime.now() - timedelta(days=days)
+    cutoff_ms = int((datetime.now(timezone.utc) - timedelta(days=days)).timestamp() * 1000)
+    condition, params = _profile_filter(profile_id)
     with get_connection() as conn:
-        if profile_id is not None:
-            rows = conn.execute(
-                """
-                SELECT m.*, p.name as profile_name
-                FROM measurements m
-                LEFT JOIN profiles p ON m.profile_id = p.id
-                WHERE m.timestamp >= ? AND m.profile_id = ?
-                ORDER BY m.timestamp ASC
-                """,
-                (cutoff.isoformat(), profile_id),
-            ).fetchall()
-        else:
-            rows = conn.execute(
-                """
-                SELECT m.*, p.name as profile_name
-                FROM measurements m
-                LEFT JOIN profiles p ON m.profile_id = p.id
-                WHERE m.timestamp >= ?
-                ORDER BY m.timestamp ASC
-                """,
-                (cutoff.isoformat(),),
-            ).fetchall()
-        return [dict(row) for row in rows]
+        return conn.execute(
+            f"""
+            SELECT * FROM measurements m
+            WHERE m.ts_ms >= ? AND {condition}
+            ORDER BY m.ts_ms ASC
+            """,
+            (cutoff_ms, *params),
+        ).fetchall()
+
+
+def get_chart_points_since(
+    days: int = 30, profile_id: int | None = None
+) -> tuple[list[str], list[float], list[float | None]]:
+    """Get per-day average weight and body fat for the last N days, oldest first.
+
+    Returns parallel (dates, weights, body_fat) lists ready for charting.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).date()
+    condition, params = _profile_filter(profile_id)
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT date,
+                ROUND(SUM(weight_sum) / SUM(measurement_count), 1),
+                ROUND(SUM(body_fat_sum) / NULLIF(SUM(body_fat_count), 0), 1)
+            FROM measurements_daily m
+            WHERE date >= ? AND {condition}
+            GROUP BY date
+            ORDER BY date ASC
+            """,
+            (cutoff.isoformat(), *params),
+        ).fetchall()
+    if not rows:
+        return [], [], []
+    dates, weights, body_fat = zip(*rows)
+    return list(dates), list(weights), list(body_fat)
 
 
 def get_last_measurement_time() -> datetime | None:
     """Get timestamp of the most recent measurement (for debouncing)."""
     with get_connection() as conn:
         row = conn.execute(
-            "SELECT timestamp FROM measurements ORDER BY timestamp DESC LIMIT 1"
+            "SELECT timestamp FROM measurements ORDER BY ts_ms DESC LIMIT 1"
         ).fetchone()
         if row:
             return datetime.fromisoformat(row["timestamp"])
@@ -318,45 +639,45 @@ def recalculate_profile_measurements(profile_id: int) -> int:
     Call this when profile height/age/gender changes.
     Returns count of updated measurements.
     """
-    from decode import calculate_body_composition
+    from decode import calculate_body_composition_batch
 
     profile = get_profile(profile_id)
     if not profile:
         return 0
-    if not all([profile.get("height_cm"), profile.get("age"), profile.get("gender")]):
+    if not all([profile["height_cm"], profile["age"], profile["gender"]]):
         return 0
 
-    with get_connection() as conn:
+    with get_connection() as conn, conn:
         rows = conn.execute(
             "SELECT id, weight_kg, impedance_ohm FROM measurements "
             "WHERE profile_id = ? AND impedance_ohm IS NOT NULL",
             (profile_id,),
         ).fetchall()
-
-        for row in rows:
-            comp = calculate_body_composition(
-                weight_kg=row["weight_kg"],
-                impedance_ohm=row["impedance_ohm"],
-                height_cm=profile["height_cm"],
-                age=profile["age"],
-                gender=profile["gender"],
-            )
-            conn.execute(
-                """UPDATE measurements SET
-                   body_fat_pct=?, fat_mass_kg=?, lean_mass_kg=?, body_water_pct=?,
-                   muscle_mass_kg=?, bone_mass_kg=?, bmr_kcal=?, bmi=?
-                   WHERE id=?""",
-                (
-                    comp.body_fat_pct,
-                    comp.fat_mass_kg,
-                    comp.lean_mass_kg,
-                    comp.body_water_pct,
-                    comp.muscle_mass_kg,
-                    comp.bone_mass_kg,
-                    comp.bmr_kcal,
-                    comp.bmi,
-                    row["id"],
-                ),
-            )
-        conn.commit()
+        if not rows:
+            return 0
+
+        comp = calculate_body_composition_batch(
+            weights_kg=np.fromiter((row["weight_kg"] for row in rows), float, len(rows)),
+            impedances_ohm=np.fromiter((row["impedance_ohm"] for row in rows), float, len(rows)),
+            height_cm=profile["height_cm"],
+            age=profile["age"],
+            gender=profile["gender"],
+        )
+        conn.executemany(
+            """UPDATE measurements SET
+               body_fat_pct=?, fat_mass_kg=?, lean_mass_kg=?, body_water_pct=?,
+               muscle_mass_kg=?, bone_mass_kg=?, bmr_kcal=?, bmi=?
+               WHERE id=?""",
+            zip(
+                comp["body_fat_pct"].tolist(),
+                comp["fat_mass_kg"].tolist(),
+                comp["lean_mass_kg"].tolist(),
+                comp["body_water_pct"].tolist(),
+                comp["muscle_mass_kg"].tolist(),
+                comp["bone_mass_kg"].tolist(),
+                comp["bmr_kcal"].tolist(),
+                comp["bmi"].tolist(),
+                (row["id"] for row in rows),
+            ),
+        )
         return len(rows)
@@ -1,6 +1,18 @@
 """Decode BLE advertisement packets and calculate body composition."""
 
+import struct
 from dataclasses import dataclass
+from functools import lru_cache
+from typing import ClassVar
+
+import numpy as np
+
+# Weight, impedance, user ID (big-endian uint16) and status byte
+_PACKET = struct.Struct(">HHHB")
+
+# Status byte bits
+STATUS_WEIGHT_COMPLETE = 0x20
+STATUS_IMPEDANCE_COMPLETE = 0x01
 
 
 @dataclass(frozen=True)
@@ -13,6 +25,10 @@ class ScaleReading:
     is_complete: bool
     is_locked: bool
 
+    def as_row_tuple(self) -> tuple:
+        """Return (weight_kg, impedance_raw, impedance_ohm) as stored in measurements."""
+        return (self.weight_kg, self.impedance_raw or None, self.impedance_ohm)
+
 
 @dataclass(frozen=True)
 class BodyComposition:
@@ -26,6 +42,22 @@ class BodyComposition:
     bmr_kcal: int
     bmi: float
 
+    # Row values for a measurement without composition
+    EMPTY_ROW: ClassVar[tuple] = (None,) * 8
+
+    def as_row_tuple(self) -> tuple:
+        """Return the metrics in measurements column order."""
+        return (
+            self.body_fat_pct,
+            self.fat_mass_kg,
+            self.lean_mass_kg,
+            self.body_water_pct,
+            self.muscle_mass_kg,
+            self.bone_mass_kg,
+            self.bmr_kcal,
+            self.bmi,
+        )
+
 
 def decode_packet(manufacturer_id: int, manufacturer_data: bytes) -> ScaleReading | None:
     """Decode tzc scale advertisement packet.
@@ -42,23 +74,21 @@ def decode_packet(manufacturer_id: int, manufacturer_data: bytes) -> ScaleReadin
     if len(manufacturer_data) < 7:
         return None
 
-    weight_raw = int.from_bytes(manufacturer_data[0:2], "big")
+    weight_raw, impedance_raw, user_id, status = _PACKET.unpack_from(manufacturer_data)
     weight_kg = weight_raw / 10
 
     # Ignore spurious readings below minimum weight threshold
     if weight_kg < 30:
         return None
 
-    impedance_raw = int.from_bytes(manufacturer_data[2:4], "big")
-    impedance_ohm = impedance_raw / 10 if impedance_raw > 0 else None
+    impedance_ohm = impedance_raw / 10 if impedance_raw else None
 
-    user_id = int.from_bytes(manufacturer_data[4:6], "big")
-
-    status = manufacturer_data[6]
-    # Complete when:
-    # - 0x21: weight + impedance both finalized, OR
-    # - 0x20 with impedance=0: weight-only mode (user not barefoot)
-    is_complete = status == 0x21 or (status == 0x20 and impedance_raw == 0)
+    # Complete when weight is final AND either:
+    # - impedance is final too (0x21), OR
+    # - impedance=0: weight-only mode (user not barefoot, 0x20)
+    is_complete = bool(status & STATUS_WEIGHT_COMPLETE) and (
+        bool(status & STATUS_IMPEDANCE_COMPLETE) or impedance_raw == 0
+    )
     is_locked = is_complete  # locked when complete
 
     return ScaleReading(
@@ -71,6 +101,31 @@ def decode_packet(manufacturer_id: int, manufacturer_data: bytes) -> ScaleReadin
     )
 
 
+@lru_cache(maxsize=32)
+def _profile_consts(height_cm: int, age: int, gender: str) -> tuple[float, ...]:
+    """Per-profile terms of the BIA formulas, computed once per profile.
+
+    Returns (height_sq, height_m_sq, lbm_a, lbm_b, lbm_c, bone_mass_kg,
+    bmr_base, bmr_weight, bmr_height, bmr_age). The BMR terms are kept separate
+    so the sum is evaluated in the same order as the textbook formula.
+    """
+    height_m_sq = (height_cm / 100) ** 2
+    if gender == "male":
+        lbm_a, lbm_b, lbm_c = 0.485, 0.338, 5.32
+        bone_mass_kg = 0.18 * height_m_sq * 22
+        bmr_base, bmr_weight = 88.36, 13.4
+        bmr_height, bmr_age = 4.8 * height_cm, 5.7 * age
+    else:
+        lbm_a, lbm_b, lbm_c = 0.474, 0.180, 5.03
+        bone_mass_kg = 0.18 * height_m_sq * 20
+        bmr_base, bmr_weight = 447.6, 9.2
+        bmr_height, bmr_age = 3.1 * height_cm, 4.3 * age
+    return (
+        height_cm**2, height_m_sq, lbm_a, lbm_b, lbm_c, bone_mass_kg,
+        bmr_base, bmr_weight, bmr_height, bmr_age,
+    )
+
+
 def calculate_body_composition(
     weight_kg: float,
     impedance_ohm: float,
@@ -79,13 +134,13 @@ def calculate_body_composition(
     gender: str,
 ) -> BodyComposition:
     """Calculate body composition using standard BIA formulas (openScale compatible)."""
-    height_sq = height_cm**2
+    (
+        height_sq, height_m_sq, lbm_a, lbm_b, lbm_c, bone_mass_kg,
+        bmr_base, bmr_weight, bmr_height, bmr_age,
+    ) = _profile_consts(height_cm, age, gender)
 
     # Lean Body Mass
-    if gender == "male":
-        lbm = 0.485 * (height_sq / impedance_ohm) + 0.338 * weight_kg + 5.32
-    else:
-        lbm = 0.474 * (height_sq / impedance_ohm) + 0.180 * weight_kg + 5.03
+    lbm = lbm_a * (height_sq / impedance_ohm) + lbm_b * weight_kg + lbm_c
 
     # Body Fat
     fat_mass_kg = weight_kg - lbm
@@ -98,21 +153,14 @@ def calculate_body_composition(
     # Muscle Mass (approximately 90% of lean mass)
     muscle_mass_kg = lbm * 0.9
 
-    # Bone Mass (estimate based on weight and gender)
-    if gender == "male":
-        bone_mass_kg = 0.18 * (height_cm / 100) ** 2 * 22
-    else:
-        bone_mass_kg = 0.18 * (height_cm / 100) ** 2 * 20
-    bone_mass_kg = min(bone_mass_kg, lbm * 0.05)  # Cap at 5% of LBM
+    # Bone Mass (estimate based on height and gender), capped at 5% of LBM
+    bone_mass_kg = min(bone_mass_kg, lbm * 0.05)
 
     # BMR (Mifflin-St Jeor)
-    if gender == "male":
-        bmr = 88.36 + (13.4 * weight_kg) + (4.8 * height_cm) - (5.7 * age)
-    else:
-        bmr = 447.6 + (9.2 * weight_kg) + (3.1 * height_cm) - (4.3 * age)
+    bmr = bmr_base + (bmr_weight * weight_kg) + bmr_height - bmr_age
 
     # BMI
-    bmi = weight_kg / (height_cm / 100) ** 2
+    bmi = weight_kg / height_m_sq
 
     return BodyComposition(
         body_fat_pct=round(body_fat_pct, 1),
@@ -124,3 +172,55 @@ def calculate_body_composition(
         bmr_kcal=round(bmr),
         bmi=round(bmi, 1),
     )
+
+
+def calculate_body_composition_batch(
+    weights_kg: np.ndarray,
+    impedances_ohm: np.ndarray,
+    height_cm: int,
+    age: int,
+    gender: str,
+) -> dict[str, np.ndarray]:
+    """Vectorized calculate_body_composition for many readings of one profile.
+
+    Returns one array per BodyComposition field, keyed by field name, equal
+    element for element to what calculate_body_composition returns.
+    """
+    (
+        height_sq, height_m_sq, lbm_a, lbm_b, lbm_c, bone_mass_kg,
+        bmr_base, bmr_weight, bmr_height, bmr_age,
+    ) = _profile_consts(height_cm, age, gender)
+
+    lbm = lbm_a * (height_sq / impedances_ohm) + lbm_b * weights_kg + lbm_c
+    fat_mass_kg = weights_kg - lbm
+    body_fat_pct = (fat_mass_kg / weights_kg) * 100
+    body_water_pct = ((lbm * 0.73) / weights_kg) * 100
+    muscle_mass_kg = lbm * 0.9
+    bone_mass = np.minimum(bone_mass_kg, lbm * 0.05)
+    bmr = bmr_base + (bmr_weight * weights_kg) + bmr_height - bmr_age
+    bmi = weights_kg / height_m_sq
+
+    return {
+        "body_fat_pct": _round_1(body_fat_pct),
+        "fat_mass_kg": _round_1(fat_mass_kg),
+        "lean_mass_kg": _round_1(lbm),
+        "body_water_pct": _round_1(body_water_pct),
+        "muscle_mass_kg": _round_1(muscle_mass_kg),
+        "bone_mass_kg": _round_1(bone_mass),
+        "bmr_kcal": np.rint(bmr).astype(np.int64),
+        "bmi": _round_1(bmi),
+    }
+
+
+def _round_1(values: np.ndarray) -> np.ndarray:
+    """Round to 1 decimal exactly like Python's round().
+
+    np.round scales by 10 before rounding, which can land on the other side
+    of a .x5 tie than the correctly rounded result the scalar path stores, so
+    only elements that close to a tie go through round() itself.
+    """
+    rounded = np.round(values, 1)
+    near_tie = np.flatnonzero(np.abs((values * 10) % 1 - 0.5) < 1e-9)
+    for i in near_tie:
+        rounded[i] = round(float(values[i]), 1)
+    return rounded
@@ -1,207 +1,187 @@
 """ETL: Process raw_packets into measurements."""
 
 import sqlite3
-from datetime import datetime, timedelta
-from config import DATABASE_PATH
-from decode import calculate_body_composition, decode_packet
+from bisect import bisect_left
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from decode import (
+    STATUS_IMPEDANCE_COMPLETE,
+    STATUS_WEIGHT_COMPLETE,
+    BodyComposition,
+    ScaleReading,
+    calculate_body_composition,
+    decode_packet,
+)
 import db
 
 
-def get_all_packets(conn: sqlite3.Connection) -> list[dict]:
-    """Get all raw packets ordered by timestamp."""
-    conn.row_factory = sqlite3.Row
-    rows = conn.execute(
-        "SELECT id, timestamp, packet_hex FROM raw_packets ORDER BY timestamp"
-    ).fetchall()
-    return [dict(row) for row in rows]
-
-
-def parse_packet_hex(packet_hex: str) -> tuple[int, bytes] | None:
-    """Parse 'mfgid:data' format into (manufacturer_id, data_bytes)."""
-    try:
-        mfg_id_hex, data_hex = packet_hex.split(":")
-        return int(mfg_id_hex, 16), bytes.fromhex(data_hex)
-    except (ValueError, AttributeError):
-        return None
+def get_all_packets(conn: sqlite3.Connection) -> Iterator[sqlite3.Row]:
+    """Stream all raw packets ordered by timestamp."""
+    yield from conn.execute(
+        "SELECT id, timestamp, mfg_id, data FROM raw_packets ORDER BY timestamp"
+    )
 
 
-def group_into_sessions(packets: list[dict], gap_seconds: int = 30) -> list[list[dict]]:
-    """Group packets into sessions based on time gaps."""
-    if not packets:
-        return []
+def _epoch_seconds(timestamp: str) -> float:
+    """Convert a stored UTC timestamp to seconds since the Unix epoch."""
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
 
-    sessions = []
-    current_session = [packets[0]]
 
-    for packet in packets[1:]:
-        prev_time = datetime.fromisoformat(current_session[-1]["timestamp"])
-        curr_time = datetime.fromisoformat(packet["timestamp"])
+def group_into_sessions(
+    packets: Iterable[sqlite3.Row], gap_seconds: int = 30, batch_size: int = 10_000
+) -> Iterator[list[sqlite3.Row]]:
+    """Group packets into sessions based on time gaps, yielding one at a time.
 
-        if curr_time - prev_time > timedelta(seconds=gap_seconds):
+    Packets are read in batches whose gaps are found with NumPy, so memory
+    stays bounded while long histories avoid a per-packet Python comparison.
+    """
+    packets = iter(packets)
+    max_gap = np.timedelta64(gap_seconds, "s")
+    current_session = []
+    prev_time = None
+
+    while batch := list(islice(packets, batch_size)):
+        times = np.array([packet["timestamp"] for packet in batch], dtype="datetime64[ms]")
+        # Gap before each packet, measured from the previous batch's last packet
+        previous = times[:1] if prev_time is None else prev_time
+        breaks = np.flatnonzero(np.diff(times, prepend=previous) > max_gap)
+
+        start = 0
+        for end in breaks.tolist():
             # Gap too large - start new session
-            sessions.append(current_session)
-            current_session = [packet]
-        else:
-            current_session.append(packet)
+            current_session.extend(batch[start:end])
+            yield current_session
+            current_session = []
+            start = end
+        current_session.extend(batch[start:])
+        prev_time = times[-1:]
 
-    sessions.append(current_session)
-    return sessions
+    if current_session:
+        yield current_session
 
 
-def find_best_reading(session: list[dict]) -> dict | None:
+def find_best_reading(session: list[sqlite3.Row]) -> dict | None:
     """Find the best reading from a session (last 0x21 packet, or last 0x20 if no 0x21)."""
-    best = None
-    best_status = 0
+    fallback = None
+
+    # Scan backwards so a session ending in 0x21 needs a single decode
+    for packet in reversed(session):
+        data = packet["data"]
+
+        # Extract status byte (byte 6) before paying for a decode. Test the
+        # flag bits, as some firmware sets other bits too (e.g. 0xA1).
+        status = data[6] if len(data) > 6 else 0
+        if not status & STATUS_WEIGHT_COMPLETE:
+            continue
 
-    for packet in session:
-        parsed = parse_packet_hex(packet["packet_hex"])
-        if not parsed:
+        # Prefer complete with impedance (0x21) over weight only (0x20)
+        has_impedance = bool(status & STATUS_IMPEDANCE_COMPLETE)
+        if not has_impedance and fallback is not None:
             continue
 
-        mfg_id, data = parsed
-        reading = decode_packet(mfg_id, data)
+        reading = decode_packet(packet["mfg_id"], data)
         if reading is None:
             continue
 
-        # Extract status byte (byte 6)
-        status = data[6] if len(data) > 6 else 0
+        best = {"packet": packet, "reading": reading, "status": status}
+        if has_impedance:
+            return best
+        fallback = best
 
-        # Prefer 0x21 (complete with impedance) over 0x20
-        if status == 0x21:
-            best = {"packet": packet, "reading": reading, "status": status}
-            best_status = 0x21
-        elif status == 0x20 and best_status != 0x21:
-            best = {"packet": packet, "reading": reading, "status": status}
-            best_status = 0x20
-
-    return best
+    return fallback
 
 
-def detect_profile(weight_kg: float, profiles: list[dict]) -> dict | None:
+def detect_profile(weight_kg: float, profiles: list[sqlite3.Row]) -> sqlite3.Row | None:
     """Find profile where weight falls within min/max range.
 
     Args:
         weight_kg: The measured weight
-        profiles: List of profile dicts from database
+        profiles: List of profile rows from database
 
     Returns:
-        Matching profile dict, or None if no profile matches
+        Matching profile row, or None if no profile matches
     """
     for profile in profiles:
-        min_w = profile.get("min_weight_kg")
-        max_w = profile.get("max_weight_kg")
+        min_w = profile["min_weight_kg"]
+        max_w = profile["max_weight_kg"]
         if min_w is not None and max_w is not None and min_w <= weight_kg <= max_w:
             return profile
     return None
 
 
-def find_existing_measurement(
-    conn: sqlite3.Connection, timestamp: str, window_seconds: int = 30
-) -> dict | None:
-    """Find existing measurement within window_seconds of timestamp."""
-    row = conn.execute(
-        """
-        SELECT id, timestamp, impedance_ohm, profile_id
+def load_existing_measurements(conn: sqlite3.Connection) -> tuple[list[int], list[sqlite3.Row]]:
+    """Load existing measurements ordered by time, with their ts_ms keys."""
+    # ts_ms is computed from the indexed timestamp rather than read from the
+    # virtual column, so the scan is served by idx_measurements_ts_imp alone
+    rows = conn.execute(
+        f"""
+        SELECT id, {db.TS_MS_SQL} AS ts_ms, impedance_ohm, profile_id
         FROM measurements
-        WHERE ABS(strftime('%s', timestamp) - strftime('%s', ?)) < ?
-        ORDER BY ABS(strftime('%s', timestamp) - strftime('%s', ?))
-        LIMIT 1
-        """,
-        (timestamp, window_seconds, timestamp),
-    ).fetchone()
-    if row:
-        return {"id": row[0], "timestamp": row[1], "impedance_ohm": row[2], "profile_id": row[3]}
-    return None
+        WHERE timestamp IS NOT NULL
+        ORDER BY timestamp
+        """
+    ).fetchall()
+    return [row["ts_ms"] for row in rows], rows
 
 
-def update_measurement(
-    conn: sqlite3.Connection,
-    measurement_id: int,
-    reading,
-    composition,
-    profile_id: int | None = None,
-) -> None:
-    """Update an existing measurement with new data."""
-    conn.execute(
-        """
-        UPDATE measurements SET
-            profile_id = ?, weight_kg = ?, impedance_raw = ?, impedance_ohm = ?,
-            body_fat_pct = ?, fat_mass_kg = ?, lean_mass_kg = ?, body_water_pct = ?,
-            muscle_mass_kg = ?, bone_mass_kg = ?, bmr_kcal = ?, bmi = ?
-        WHERE id = ?
-        """,
-        (
-            profile_id,
-            reading.weight_kg,
-            reading.impedance_raw if reading.impedance_raw else None,
-            reading.impedance_ohm,
-            composition.body_fat_pct if composition else None,
-            composition.fat_mass_kg if composition else None,
-            composition.lean_mass_kg if composition else None,
-            composition.body_water_pct if composition else None,
-            composition.muscle_mass_kg if composition else None,
-            composition.bone_mass_kg if composition else None,
-            composition.bmr_kcal if composition else None,
-            composition.bmi if composition else None,
-            measurement_id,
-        ),
-    )
+def find_existing_measurement(
+    existing: tuple[list[int], list[sqlite3.Row]], timestamp: str, window_seconds: int = 30
+) -> sqlite3.Row | None:
+    """Find existing measurement within window_seconds of timestamp.
+
+    existing is the result of load_existing_measurements().
+    """
+    keys, rows = existing
+    target_ms = round(_epoch_seconds(timestamp) * 1000)
+    window_ms = window_seconds * 1000
+
+    # The nearest measurement is one of the neighbours of the insertion point
+    i = bisect_left(keys, target_ms)
+    best = None
+    best_distance = window_ms
+    for j in (i - 1, i):
+        if 0 <= j < len(keys) and abs(keys[j] - target_ms) < best_distance:
+            best = rows[j]
+            best_distance = abs(keys[j] - target_ms)
+    return best
 
 
-def save_measurement(
-    conn: sqlite3.Connection,
+def measurement_row(
     timestamp: str,
-    reading,
-    composition,
+    reading: ScaleReading,
+    composition: BodyComposition | None,
     profile_id: int | None = None,
-) -> int:
-    """Save measurement to database."""
-    cursor = conn.execute(
-        """
-        INSERT INTO measurements (
-            timestamp, profile_id, weight_kg, impedance_raw, impedance_ohm,
-            body_fat_pct, fat_mass_kg, lean_mass_kg, body_water_pct,
-            muscle_mass_kg, bone_mass_kg, bmr_kcal, bmi
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            timestamp,
-            profile_id,
-            reading.weight_kg,
-            reading.impedance_raw if reading.impedance_raw else None,
-            reading.impedance_ohm,
-            composition.body_fat_pct if composition else None,
-            composition.fat_mass_kg if composition else None,
-            composition.lean_mass_kg if composition else None,
-            composition.body_water_pct if composition else None,
-            composition.muscle_mass_kg if composition else None,
-            composition.bone_mass_kg if composition else None,
-            composition.bmr_kcal if composition else None,
-            composition.bmi if composition else None,
-        ),
-    )
-    return cursor.lastrowid or 0
+) -> tuple:
+    """Build a measurement row in db.save_measurements_bulk column order."""
+    composition_row = composition.as_row_tuple() if composition else BodyComposition.EMPTY_ROW
+    return (timestamp, profile_id, *reading.as_row_tuple(), *composition_row)
 
 
 def run_etl() -> dict:
     """Run the ETL process. Returns stats."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.execute("PRAGMA journal_mode=WAL")
-
     # Load profiles from database
     profiles = db.get_profiles()
+    # Weights come in 0.1 kg steps and repeat across sessions; match each once
+    profile_by_weight = {}
 
-    try:
-        packets = get_all_packets(conn)
-
-        if not packets:
-            return {"packets": 0, "sessions": 0, "measurements": 0, "updated": 0}
-
-        sessions = group_into_sessions(packets)
+    with db.get_connection() as conn:
+        packet_count = 0
+        session_count = 0
         measurements_created = 0
         measurements_updated = 0
+        to_insert = []
+        to_update = []
+        existing_measurements = load_existing_measurements(conn)
+
+        # Packets are streamed, so only one session is held in memory at a time
+        for session in group_into_sessions(get_all_packets(conn)):
+            packet_count += len(session)
+            session_count += 1
 
-        for session in sessions:
             best = find_best_reading(session)
             if not best:
                 continue
@@ -210,12 +190,14 @@ def run_etl() -> dict:
             timestamp = best["packet"]["timestamp"]
 
             # Detect profile by weight range
-            profile = detect_profile(reading.weight_kg, profiles)
+            if reading.weight_kg not in profile_by_weight:
+                profile_by_weight[reading.weight_kg] = detect_profile(reading.weight_kg, profiles)
+            profile = profile_by_weight[reading.weight_kg]
             profile_id = profile["id"] if profile else None
 
             # Calculate body composition if we have impedance AND a complete profile
             composition = None
-            if reading.impedance_ohm and profile and profile.get("height_cm") and profile.get("age") and profile.get("gender"):
+            if reading.impedance_ohm and profile and profile["height_cm"] and profile["age"] and profile["gender"]:
                 composition = calculate_body_composition(
                     weight_kg=reading.weight_kg,
                     impedance_ohm=reading.impedance_ohm,
@@ -224,29 +206,30 @@ def run_etl() -> dict:
                     gender=profile["gender"],
                 )
 
+            row = measurement_row(timestamp, reading, composition, profile_id)
+
             # Check for existing measurement in time window
-            existing = find_existing_measurement(conn, timestamp)
+            existing = find_existing_measurement(existing_measurements, timestamp)
             if existing:
                 # Update if: new impedance data OR missing profile_id (backfill)
                 needs_impedance = reading.impedance_ohm and not existing["impedance_ohm"]
                 needs_profile = existing["profile_id"] is None
                 if needs_impedance or needs_profile:
-                    update_measurement(conn, existing["id"], reading, composition, profile_id)
+                    to_update.append((*row[1:], existing["id"]))  # Keep original timestamp
                     measurements_updated += 1
                 # Otherwise skip (already have this measurement)
             else:
-                save_measurement(conn, timestamp, reading, composition, profile_id)
+                to_insert.append(row)
                 measurements_created += 1
 
-        conn.commit()
+        # Inserts and updates commit together in one transaction
+        db.save_measurements_bulk(to_insert, to_update)
         return {
-            "packets": len(packets),
-            "sessions": len(sessions),
+            "packets": packet_count,
+            "sessions": session_count,
             "measurements": measurements_created,
             "updated": measurements_updated,
         }
-    finally:
-        conn.close()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,9 @@
 
 import asyncio
 import logging
+import sqlite3
+import struct
+from datetime import datetime, timezone
 
 import aioblescan
 
@@ -14,45 +17,56 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+SCALE_NAME_BYTES = SCALE_NAME.encode("utf-8")
+
+# Packets are buffered here by the BLE callback and written in batches,
+# so the event loop never waits on a commit per advertisement
+raw_packet_queue: asyncio.Queue[tuple[str, int, bytes]] = asyncio.Queue()
+FLUSH_INTERVAL_SECONDS = 0.5
+
+# Little-endian company identifier at the start of manufacturer data
+_MANUFACTURER_ID = struct.Struct("<H")
+
 
 def parse_hci_packet(data: bytes) -> tuple[str | None, int | None, bytes | None]:
     """Parse raw HCI LE advertising packet.
 
     Returns (device_name, manufacturer_id, manufacturer_data) or (None, None, None).
+    Advertisements named anything other than SCALE_NAME are dropped as soon
+    as the name is seen.
     """
-    if len(data) < 14 or data[0:2] != b'\x04\x3e':
+    if len(data) < 14 or data[0] != 0x04 or data[1] != 0x3E:
         return None, None, None
 
     if data[3] != 0x02:  # Not LE Advertising Report
         return None, None, None
 
-    adv_len = data[13]
-    adv_data = data[14:14 + adv_len]
+    # Walk the AD structures in place; only returned values are copied
+    view = memoryview(data)
+    end = min(14 + data[13], len(data))
 
     device_name = None
     manufacturer_id = None
     manufacturer_data = None
 
-    i = 0
-    while i < len(adv_data):
-        if i + 1 >= len(adv_data):
-            break
-        length = adv_data[i]
-        if length == 0 or i + length >= len(adv_data):
+    i = 14
+    while i + 1 < end:
+        length = data[i]
+        if length == 0 or i + length >= end:
             break
-        ad_type = adv_data[i + 1]
-        ad_value = adv_data[i + 2:i + 1 + length]
+        ad_type = data[i + 1]
+        value_end = i + 1 + length
 
         if ad_type == 0x09:  # Complete Local Name
-            try:
-                device_name = ad_value.decode('utf-8')
-            except:
-                pass
-        elif ad_type == 0xFF and len(ad_value) >= 2:  # Manufacturer Specific Data
-            manufacturer_id = int.from_bytes(ad_value[0:2], "little")
-            manufacturer_data = ad_value[2:]
+            # Compare raw bytes; other devices' names are never decoded
+            if view[i + 2:value_end] != SCALE_NAME_BYTES:
+                return None, None, None  # Not the scale - skip remaining fields
+            device_name = SCALE_NAME
+        elif ad_type == 0xFF and length >= 3:  # Manufacturer Specific Data
+            (manufacturer_id,) = _MANUFACTURER_ID.unpack_from(data, i + 2)
+            manufacturer_data = view[i + 4:value_end].tobytes()
 
-        i += 1 + length
+        i = value_end
 
     return device_name, manufacturer_id, manufacturer_data
 
@@ -67,10 +81,43 @@ def process_hci_packet(data: bytes) -> None:
     if manufacturer_id is None or manufacturer_data is None:
         return
 
-    # Save raw packet - that's all we do
-    packet_hex = f"{manufacturer_id:04x}:{manufacturer_data.hex()}"
-    db.save_raw_packet(packet_hex)
-    log.debug("Saved: %s", packet_hex)
+    # Queue raw packet for the writer - that's all we do
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    raw_packet_queue.put_nowait((timestamp, manufacturer_id, manufacturer_data))
+    if log.isEnabledFor(logging.DEBUG):  # Skip the hex encoding unless it will be logged
+        log.debug("Queued: %04x:%s", manufacturer_id, manufacturer_data.hex())
+
+
+def flush_raw_packets() -> None:
+    """Save all queued raw packets in one transaction.
+
+    If the write fails the packets are put back on the queue and the error
+    is re-raised, so nothing is lost and the next flush retries them.
+    """
+    batch = []
+    while not raw_packet_queue.empty():
+        batch.append(raw_packet_queue.get_nowait())
+    if not batch:
+        return
+    try:
+        db.save_raw_packets_bulk(batch)
+    except BaseException:
+        # Runs on the event loop thread, so no packets arrived in between
+        for row in batch:
+            raw_packet_queue.put_nowait(row)
+        raise
+    log.debug("Saved %d packets", len(batch))
+
+
+async def flush_loop() -> None:
+    """Periodically write queued raw packets to the database."""
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        try:
+            flush_raw_packets()
+        except sqlite3.Error as e:
+            # e.g. locked while the dashboard's ETL writes; keep scanning
+            log.warning("Could not save %d queued packets, retrying: %s", raw_packet_queue.qsize(), e)
 
 
 async def main() -> None:
@@ -96,11 +143,16 @@ async def main() -> None:
     log.info("Scanning...")
 
     try:
-        while True:
-            await asyncio.sleep(1)
+        await flush_loop()
     finally:
-        await btctrl.stop_scan_request()
-        conn.close()
+        try:
+            await btctrl.stop_scan_request()
+            conn.close()
+        finally:
+            try:
+                flush_raw_packets()
+            except sqlite3.Error as e:
+                log.error("Lost %d queued packets on shutdown: %s", raw_packet_queue.qsize(), e)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,15 @@
+"""Shared test fixtures."""
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the db module at a fresh database for the test."""
+    monkeypatch.setattr(db, "DATABASE_PATH", tmp_path / "test.db")
+    db.close_connection()
+    db.init_db()
+    yield
+    db.close_connection()
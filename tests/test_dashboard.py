@@ -0,0 +1,41 @@
+"""Tests for dashboard module."""
+
+import threading
+import urllib.request
+
+import pytest
+from werkzeug.serving import make_server
+
+import dashboard
+import db
+
+
+@pytest.mark.usefixtures("temp_db")
+class TestServing:
+    """Tests that go through the threaded development server."""
+
+    def test_requests_share_one_connection(self, monkeypatch):
+        """Each request runs on its own thread but reuses the one connection."""
+        opened = []
+        connect = db._connect
+
+        def counting_connect():
+            opened.append(connect())
+            return opened[-1]
+
+        monkeypatch.setattr(db, "_connect", counting_connect)
+        db.close_connection()
+        dashboard.cache.clear()
+        server = make_server("127.0.0.1", 0, dashboard.app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            for days in range(1, 6):
+                # Distinct query strings so no response comes from the cache
+                url = f"http://127.0.0.1:{server.server_port}/api/chart-data?days={days}"
+                with urllib.request.urlopen(url) as response:
+                    assert response.status == 200
+        finally:
+            server.shutdown()
+
+        assert len(opened) == 1
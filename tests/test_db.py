@@ -0,0 +1,304 @@
+"""Tests for db module."""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import db
+
+
+pytestmark = pytest.mark.usefixtures("temp_db")
+
+
+def add_measurement(timestamp: str, weight_kg: float, profile_id: int | None = None, **fields) -> None:
+    """Insert a measurement row directly."""
+    columns = {"timestamp": timestamp, "weight_kg": weight_kg, "profile_id": profile_id, **fields}
+    with db.get_connection() as conn:
+        conn.execute(
+            f"INSERT INTO measurements ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})",
+            tuple(columns.values()),
+        )
+        conn.commit()
+
+
+class TestConnection:
+    """Tests for the shared process-wide connection."""
+
+    def test_connection_is_reused(self):
+        """Successive and nested calls share a connection."""
+        with db.get_connection() as first, db.get_connection() as second:
+            assert first is second
+
+    def test_connection_shared_across_threads(self):
+        """Other threads get the same connection instead of opening their own."""
+        seen = []
+
+        def use_connection():
+            with db.get_connection() as conn:
+                seen.append(conn)
+
+        thread = threading.Thread(target=use_connection)
+        thread.start()
+        thread.join()
+
+        with db.get_connection() as conn:
+            assert seen == [conn]
+
+    def test_pragmas_applied(self):
+        """WAL and relaxed sync are set when the connection is opened."""
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+    def test_page_size_rebuilt(self):
+        """init_db converts the file to 8 KB pages and keeps WAL mode."""
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA page_size").fetchone()[0] == db.PAGE_SIZE
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def test_new_file_created_with_page_size(self, tmp_path, monkeypatch):
+        """Fresh databases start with PAGE_SIZE pages instead of being rebuilt."""
+        monkeypatch.setattr(db, "DATABASE_PATH", tmp_path / "fresh.db")
+        monkeypatch.setattr(db, "_rebuild_page_size", None)  # Must not be needed
+        db.close_connection()
+
+        db.init_db()
+
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA page_size").fetchone()[0] == db.PAGE_SIZE
+
+    def test_page_size_rebuild_skipped_while_shared(self, tmp_path, monkeypatch, caplog):
+        """A database open elsewhere keeps its pages and WAL mode, with a warning."""
+        path = tmp_path / "legacy.db"
+        legacy = sqlite3.connect(path)
+        legacy.executescript("PRAGMA page_size=4096; PRAGMA journal_mode=WAL; CREATE TABLE t (x);")
+        monkeypatch.setattr(db, "DATABASE_PATH", path)
+        db.close_connection()
+
+        db.init_db()
+        legacy.close()
+
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA page_size").fetchone()[0] == 4096
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert "Skipping conversion" in caplog.text
+
+    def test_rollback_on_error(self):
+        """Uncommitted writes are discarded when the block raises."""
+        with pytest.raises(RuntimeError):
+            with db.get_connection() as conn:
+                conn.execute("INSERT INTO profiles (name) VALUES ('ghost')")
+                raise RuntimeError("boom")
+
+        assert db.get_profiles() == []
+
+
+class TestSchema:
+    """Tests for schema and indexes."""
+
+    def test_profile_query_avoids_sort(self):
+        """Per-profile newest-first queries are served by the composite index."""
+        with db.get_connection() as conn:
+            plan = " ".join(
+                row["detail"]
+                for row in conn.execute(
+                    "EXPLAIN QUERY PLAN SELECT * FROM measurements "
+                    "WHERE profile_id = ? ORDER BY ts_ms DESC LIMIT 10",
+                    (1,),
+                )
+            )
+        assert "idx_measurements_profile_ts_ms" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+class TestMigration:
+    """Tests for upgrading databases created by older versions."""
+
+    def test_upgrades_legacy_measurements(self, tmp_path, monkeypatch):
+        """A pre-profiles database gains new columns, indexes and aggregates."""
+        monkeypatch.setattr(db, "DATABASE_PATH", tmp_path / "legacy.db")
+        db.close_connection()
+        with db.get_connection() as conn:
+            conn.executescript("""
+                CREATE TABLE measurements (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    weight_kg REAL NOT NULL,
+                    impedance_ohm REAL,
+                    body_fat_pct REAL
+                );
+                CREATE INDEX idx_measurements_timestamp ON measurements(timestamp);
+                INSERT INTO measurements (timestamp, weight_kg, body_fat_pct)
+                VALUES ('2024-01-01 08:00:00', 80.0, 20.0);
+            """)
+
+        db.init_db()
+
+        latest = db.get_latest_measurement()
+        assert latest["ts_ms"] == 1704096000000
+        assert latest["profile_id"] is None
+        with db.get_connection() as conn:
+            daily = conn.execute("SELECT * FROM measurements_daily").fetchall()
+            indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert [tuple(row) for row in daily] == [("2024-01-01", 0, 1, 80.0, 1, 20.0)]
+        assert "idx_measurements_profile_ts_ms" in indexes
+        assert "idx_measurements_timestamp" not in indexes
+
+    def test_splits_legacy_packet_hex(self, tmp_path, monkeypatch):
+        """Text packet_hex rows are converted to mfg_id and data columns."""
+        monkeypatch.setattr(db, "DATABASE_PATH", tmp_path / "legacy.db")
+        db.close_connection()
+        with db.get_connection() as conn:
+            conn.executescript("""
+                CREATE TABLE raw_packets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    packet_hex TEXT NOT NULL
+                );
+                INSERT INTO raw_packets (timestamp, packet_hex) VALUES
+                    ('2024-01-01 08:00:00', '74c0:0339139b'),
+                    ('2024-01-01 08:00:01', 'garbage');
+            """)
+
+        db.init_db()
+
+        with db.get_connection() as conn:
+            rows = conn.execute("SELECT id, timestamp, mfg_id, data FROM raw_packets").fetchall()
+        assert [tuple(row) for row in rows] == [(1, "2024-01-01 08:00:00", 0x74C0, b"\x03\x39\x13\x9b")]
+
+    def test_backfills_daily_aggregates_once(self):
+        """The daily table is created and backfilled by one versioned step."""
+        add_measurement("2024-01-01 08:00:00", 80.0)
+        with db.get_connection() as conn:
+            conn.executescript("DROP TABLE measurements_daily; PRAGMA user_version = 3;")
+
+        db.migrate_db()
+        db.migrate_db()
+
+        with db.get_connection() as conn:
+            daily = conn.execute("SELECT * FROM measurements_daily").fetchall()
+        assert [tuple(row) for row in daily] == [("2024-01-01", 0, 1, 80.0, 0, 0.0)]
+
+    def test_records_schema_version(self):
+        """Migrated databases are stamped so later starts skip migration."""
+        with db.get_connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+            conn.execute("ALTER TABLE profiles DROP COLUMN max_weight_kg")
+
+        db.migrate_db()
+
+        with db.get_connection() as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(profiles)")}
+        assert "max_weight_kg" not in columns
+
+
+class TestProfiles:
+    """Tests for profile CRUD functions."""
+
+    def test_save_and_get_profile(self):
+        """A saved profile can be read back."""
+        profile_id = db.save_profile(name="Alice", height_cm=165, age=35, gender="female")
+
+        profile = db.get_profile(profile_id)
+        assert profile["name"] == "Alice"
+        assert profile["height_cm"] == 165
+
+    def test_recalculate_profile_measurements(self):
+        """Changing a profile recomputes composition for its measurements."""
+        profile_id = db.save_profile(name="Alice", height_cm=165, age=35, gender="female")
+        add_measurement("2024-01-01 08:00:00", 65.0, profile_id, impedance_ohm=550.0)
+        add_measurement("2024-01-02 08:00:00", 66.0, profile_id)  # no impedance
+
+        db.save_profile(name="Alice", height_cm=175, age=35, gender="female", profile_id=profile_id)
+        updated = db.recalculate_profile_measurements(profile_id)
+
+        assert updated == 1
+        with_impedance, without = reversed(db.get_measurements(profile_id=profile_id))
+        assert with_impedance["bmi"] == pytest.approx(65.0 / 1.75**2, abs=0.05)
+        assert with_impedance["bmr_kcal"] > 0
+        assert without["body_fat_pct"] is None
+
+    def test_delete_profile(self):
+        """Deleted profiles are no longer returned."""
+        profile_id = db.save_profile(name="Bob")
+        db.delete_profile(profile_id)
+
+        assert db.get_profile(profile_id) is None
+
+
+class TestDashboardBundle:
+    """Tests for get_dashboard_bundle."""
+
+    def test_defaults_to_first_profile(self):
+        """Without a profile filter the first profile is selected."""
+        alice = db.save_profile(name="Alice")
+        bob = db.save_profile(name="Bob")
+        add_measurement("2024-01-01 08:00:00", 60.0, alice)
+        add_measurement("2024-01-02 08:00:00", 61.0, alice)
+        add_measurement("2024-01-03 08:00:00", 90.0, bob)
+
+        profile_id, latest, recent, profiles = db.get_dashboard_bundle()
+
+        assert profile_id == alice
+        assert latest["weight_kg"] == 61.0
+        assert [m["weight_kg"] for m in recent] == [61.0, 60.0]
+        assert [p["name"] for p in profiles] == ["Alice", "Bob"]
+
+    def test_explicit_profile_and_limit(self):
+        """An explicit profile filters measurements and limit caps the list."""
+        alice = db.save_profile(name="Alice")
+        bob = db.save_profile(name="Bob")
+        add_measurement("2024-01-01 08:00:00", 60.0, alice)
+        add_measurement("2024-01-02 08:00:00", 90.0, bob)
+        add_measurement("2024-01-03 08:00:00", 91.0, bob)
+
+        profile_id, latest, recent, _ = db.get_dashboard_bundle(bob, limit=1)
+
+        assert profile_id == bob
+        assert latest["profile_id"] == bob
+        assert [m["weight_kg"] for m in recent] == [91.0]
+
+    def test_empty_database(self):
+        """No profiles and no measurements yields empty results."""
+        assert db.get_dashboard_bundle() == (None, None, [], [])
+
+
+class TestDailyAggregates:
+    """Tests for the trigger-maintained measurements_daily table."""
+
+    def setup_method(self):
+        now = datetime.now(timezone.utc)
+        self.today = now.strftime("%Y-%m-%d")
+        self.yesterday = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    def test_averages_per_day(self):
+        """Multiple measurements on one day are averaged."""
+        profile_id = db.save_profile(name="Alice")
+        add_measurement(f"{self.yesterday} 08:00:00", 60.0, profile_id, body_fat_pct=20.0)
+        add_measurement(f"{self.today} 08:00:00", 61.0, profile_id, body_fat_pct=21.0)
+        add_measurement(f"{self.today} 20:00:00", 62.0, profile_id)
+
+        dates, weights, body_fat = db.get_chart_points_since(days=30, profile_id=profile_id)
+
+        assert dates == [self.yesterday, self.today]
+        assert weights == [60.0, 61.5]
+        assert body_fat == [20.0, 21.0]
+
+    def test_tracks_updates_and_deletes(self):
+        """Reassigning and deleting measurements keeps the aggregates in sync."""
+        alice = db.save_profile(name="Alice")
+        bob = db.save_profile(name="Bob")
+        add_measurement(f"{self.today} 08:00:00", 60.0)
+        add_measurement(f"{self.today} 09:00:00", 90.0, bob)
+
+        with db.get_connection() as conn, conn:
+            conn.execute("UPDATE measurements SET profile_id = ? WHERE weight_kg = 60.0", (alice,))
+            conn.execute("DELETE FROM measurements WHERE profile_id = ?", (bob,))
+
+        assert db.get_chart_points_since(profile_id=alice) == ([self.today], [60.0], [None])
+        assert db.get_chart_points_since(profile_id=bob) == ([], [], [])
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM measurements_daily").fetchone()[0] == 1
@@ -1,8 +1,17 @@
 """Tests for decode module."""
 
+import dataclasses
+
+import numpy as np
 import pytest
 
-from decode import ScaleReading, BodyComposition, decode_packet, calculate_body_composition
+from decode import (
+    ScaleReading,
+    BodyComposition,
+    decode_packet,
+    calculate_body_composition,
+    calculate_body_composition_batch,
+)
 
 
 class TestDecodePacket:
@@ -62,6 +71,36 @@ class TestDecodePacket:
         assert result.impedance_ohm is None
         assert result.is_complete is True  # 0x20 + impedance=0 means complete
 
+    def test_decode_with_mac_suffix(self):
+        """Trailing MAC address bytes are ignored (README example packet)."""
+        packet = bytes.fromhex("03380000000220fe98000c91d8")
+
+        result = decode_packet(0x74C0, packet)
+
+        assert result is not None
+        assert result.weight_kg == 82.4
+        assert result.impedance_raw == 0
+        assert result.user_id == 2
+        assert result.is_complete is True
+
+    def test_decode_status_extra_bits(self):
+        """Status is tested bitwise, so unrelated high bits don't matter."""
+        packet = bytes([0x03, 0x39, 0x13, 0x9B, 0x00, 0x02, 0xA1])
+
+        result = decode_packet(0, packet)
+
+        assert result is not None
+        assert result.is_complete is True
+
+    def test_decode_status_not_final(self):
+        """Without the weight-complete bit the reading is never complete."""
+        packet = bytes([0x03, 0x39, 0x00, 0x00, 0x00, 0x02, 0x01])
+
+        result = decode_packet(0, packet)
+
+        assert result is not None
+        assert result.is_complete is False
+
     def test_decode_packet_too_short(self):
         """Return None for packets that are too short."""
         packet = bytes([0x03, 0x35, 0x00])  # only 3 bytes, need 7
@@ -82,6 +121,12 @@ class TestDecodePacket:
         ])
         assert decode_packet(0, packet) is None
 
+    def test_row_tuple_without_impedance(self):
+        """A zero raw impedance is stored as NULL."""
+        packet = bytes([0x03, 0x39, 0x00, 0x00, 0x00, 0x02, 0x20])
+
+        assert decode_packet(0, packet).as_row_tuple() == (82.5, None, None)
+
 
 class TestCalculateBodyComposition:
     """Tests for calculate_body_composition function."""
@@ -154,3 +199,42 @@ class TestCalculateBodyComposition:
         assert result.bmi == round(result.bmi, 1)
         # BMR should be integer
         assert result.bmr_kcal == int(result.bmr_kcal)
+
+    def test_row_tuple_matches_fields(self):
+        """as_row_tuple lists every metric in field order."""
+        result = calculate_body_composition(
+            weight_kg=82.5,
+            impedance_ohm=501.9,
+            height_cm=173,
+            age=43,
+            gender="male",
+        )
+
+        assert result.as_row_tuple() == dataclasses.astuple(result)
+        assert len(BodyComposition.EMPTY_ROW) == len(dataclasses.fields(BodyComposition))
+
+
+class TestCalculateBodyCompositionBatch:
+    """Tests for calculate_body_composition_batch function."""
+
+    @pytest.mark.parametrize(
+        "height_cm,age,gender",
+        [(173, 43, "male"), (165, 35, "male"), (173, 43, "female"), (165, 35, "female")],
+    )
+    def test_matches_scalar(self, height_cm, age, gender):
+        """Each element equals the scalar calculation exactly."""
+        # Includes readings whose results sit on a .x5 rounding tie
+        weights = np.array([55.0, 70.0, 82.5, 110.3, 60.0, 45.2, 131.5, 149.0, 45.5, 52.5, 75.2])
+        impedances = np.array([620.0, 500.0, 501.9, 410.2, 436.5, 519.0, 426.6, 544.5, 605.0, 495.0, 412.5])
+
+        batch = calculate_body_composition_batch(weights, impedances, height_cm, age, gender)
+
+        for i, (weight, impedance) in enumerate(zip(weights.tolist(), impedances.tolist())):
+            scalar = calculate_body_composition(weight, impedance, height_cm, age, gender)
+            for field in dataclasses.fields(BodyComposition):
+                assert batch[field.name][i] == getattr(scalar, field.name)
+
+    def test_bmr_is_integer(self):
+        """BMR comes back as integers like the scalar version."""
+        batch = calculate_body_composition_batch(np.array([70.0]), np.array([500.0]), 175, 30, "male")
+        assert batch["bmr_kcal"].dtype.kind == "i"
@@ -0,0 +1,196 @@
+"""Tests for etl module."""
+
+import pytest
+
+import db
+from etl import (
+    find_best_reading,
+    find_existing_measurement,
+    group_into_sessions,
+    load_existing_measurements,
+    run_etl,
+)
+
+
+def packet(timestamp: str, weight_raw: int, impedance_raw: int, status: int) -> dict:
+    """Build a stored raw packet for a scale advertisement."""
+    data = weight_raw.to_bytes(2, "big") + impedance_raw.to_bytes(2, "big") + bytes([0x00, 0x01, status])
+    return {"timestamp": timestamp, "mfg_id": 0x74C0, "data": data}
+
+
+def save_packets(*packets: dict) -> None:
+    """Store packets built with packet() in raw_packets."""
+    db.save_raw_packets_bulk([(p["timestamp"], p["mfg_id"], p["data"]) for p in packets])
+
+
+class TestGroupIntoSessions:
+    """Tests for group_into_sessions function."""
+
+    def test_splits_on_gap(self):
+        """Packets more than 30s apart start a new session."""
+        packets = [
+            {"timestamp": "2024-01-01 08:00:00"},
+            {"timestamp": "2024-01-01 08:00:20"},
+            {"timestamp": "2024-01-01 08:01:00"},
+        ]
+
+        sessions = group_into_sessions(packets)
+
+        assert [len(s) for s in sessions] == [2, 1]
+
+    def test_sessions_span_batches(self):
+        """Gaps are detected across batch boundaries."""
+        packets = [
+            {"timestamp": "2024-01-01 08:00:00"},
+            {"timestamp": "2024-01-01 08:00:20"},
+            {"timestamp": "2024-01-01 08:00:40"},
+            {"timestamp": "2024-01-01 08:01:20"},
+            {"timestamp": "2024-01-01 08:01:30"},
+        ]
+
+        sessions = group_into_sessions(packets, batch_size=2)
+
+        assert [len(s) for s in sessions] == [3, 2]
+
+    def test_empty(self):
+        """No packets gives no sessions."""
+        assert list(group_into_sessions([])) == []
+
+
+class TestFindBestReading:
+    """Tests for find_best_reading function."""
+
+    def test_prefers_last_impedance_packet(self):
+        """The last 0x21 packet wins even if 0x20 packets follow it."""
+        session = [
+            packet("2024-01-01 08:00:00", 820, 5000, 0x21),
+            packet("2024-01-01 08:00:01", 821, 5010, 0x21),
+            packet("2024-01-01 08:00:02", 822, 0, 0x20),
+        ]
+
+        best = find_best_reading(session)
+
+        assert best["packet"] is session[1]
+        assert best["status"] == 0x21
+
+    def test_falls_back_to_last_weight_packet(self):
+        """Without 0x21 the last 0x20 packet is used; others are ignored."""
+        session = [
+            packet("2024-01-01 08:00:00", 820, 0, 0x20),
+            packet("2024-01-01 08:00:01", 821, 0, 0x20),
+            packet("2024-01-01 08:00:02", 822, 0, 0x00),
+        ]
+
+        assert find_best_reading(session)["packet"] is session[1]
+
+    def test_status_with_extra_bits(self):
+        """Firmware setting extra status bits (0xA0/0xA1) is handled by flag."""
+        session = [
+            packet("2024-01-01 08:00:00", 820, 0, 0xA0),
+            packet("2024-01-01 08:00:01", 821, 5010, 0xA1),
+            packet("2024-01-01 08:00:02", 822, 0, 0xA0),
+        ]
+
+        best = find_best_reading(session)
+
+        assert best["packet"] is session[1]
+        assert best["reading"].is_complete
+        assert find_best_reading([session[0], session[2]])["packet"] is session[2]
+
+
+@pytest.mark.usefixtures("temp_db")
+class TestFindExistingMeasurement:
+    """Tests for find_existing_measurement function."""
+
+    def test_nearest_within_window(self):
+        """The closest measurement inside the window is returned."""
+        db.save_measurements_bulk([
+            ("2024-01-01 07:59:40", None, 80.0, *[None] * 10),
+            ("2024-01-01 08:00:10", None, 81.0, *[None] * 10),
+            ("2024-01-01 08:01:00", None, 82.0, *[None] * 10),
+        ])
+
+        with db.get_connection() as conn:
+            measurements = load_existing_measurements(conn)
+
+        existing = find_existing_measurement(measurements, "2024-01-01 08:00:00")
+        missing = find_existing_measurement(measurements, "2024-01-01 08:00:30", window_seconds=20)
+
+        assert existing["ts_ms"] == 1704096010000
+        assert missing is None
+
+    def test_load_is_covered_by_index(self):
+        """Loading existing measurements reads only idx_measurements_ts_imp."""
+        statements = []
+        with db.get_connection() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                load_existing_measurements(conn)
+            finally:
+                conn.set_trace_callback(None)
+            plan = " ".join(row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {statements[-1]}"))
+
+        assert "COVERING INDEX idx_measurements_ts_imp" in plan
+
+
+@pytest.mark.usefixtures("temp_db")
+class TestRunEtl:
+    """Tests for run_etl function."""
+
+    def test_creates_measurement_with_composition(self):
+        """A session ending in a 0x21 packet becomes one measurement."""
+        profile_id = db.save_profile(
+            name="Alice", min_weight_kg=70, max_weight_kg=90, height_cm=173, age=43, gender="male"
+        )
+        save_packets(
+            packet("2024-01-01 08:00:00", 824, 0, 0x20),
+            packet("2024-01-01 08:00:05", 825, 5019, 0x21),
+            packet("2024-01-02 08:00:00", 820, 0, 0x20),
+        )
+
+        stats = run_etl()
+
+        assert stats == {"packets": 3, "sessions": 2, "measurements": 2, "updated": 0}
+        older, newer = reversed(db.get_measurements(profile_id=profile_id))
+        assert older["timestamp"] == "2024-01-01 08:00:05"
+        assert older["impedance_ohm"] == pytest.approx(501.9)
+        assert older["body_fat_pct"] is not None
+        assert newer["body_fat_pct"] is None
+
+    def test_rerun_is_idempotent(self):
+        """Re-running over the same packets creates nothing new."""
+        save_packets(packet("2024-01-01 08:00:00", 825, 5019, 0x21))
+        run_etl()
+
+        stats = run_etl()
+
+        assert stats["measurements"] == 0
+        assert len(db.get_measurements()) == 1
+
+    def test_backfills_profile_on_rerun(self):
+        """Measurements saved before a matching profile existed are updated."""
+        save_packets(packet("2024-01-01 08:00:00", 825, 5019, 0x21))
+        run_etl()
+        profile_id = db.save_profile(
+            name="Alice", min_weight_kg=70, max_weight_kg=90, height_cm=173, age=43, gender="male"
+        )
+
+        stats = run_etl()
+
+        assert stats["updated"] == 1
+        (measurement,) = db.get_measurements()
+        assert measurement["profile_id"] == profile_id
+        assert measurement["body_fat_pct"] is not None
+
+    def test_status_with_extra_bits(self):
+        """Sessions from firmware reporting 0xA0/0xA1 status become measurements."""
+        save_packets(
+            packet("2024-01-01 08:00:00", 824, 0, 0xA0),
+            packet("2024-01-01 08:00:05", 825, 5019, 0xA1),
+        )
+
+        stats = run_etl()
+
+        assert stats["measurements"] == 1
+        (measurement,) = db.get_measurements()
+        assert measurement["impedance_ohm"] == pytest.approx(501.9)
@@ -0,0 +1,93 @@
+"""Tests for scanner module."""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+import db
+import scanner
+from scanner import parse_hci_packet
+
+
+def hci_packet(*fields: tuple[int, bytes]) -> bytes:
+    """Build an HCI LE advertising report carrying the given AD structures."""
+    adv_data = b"".join(bytes([len(value) + 1, ad_type]) + value for ad_type, value in fields)
+    header = b"\x04\x3e" + bytes([11 + len(adv_data), 0x02]) + bytes(9)
+    return header + bytes([len(adv_data)]) + adv_data
+
+
+class TestParseHciPacket:
+    """Tests for parse_hci_packet function."""
+
+    def test_name_and_manufacturer_data(self):
+        """Local name and manufacturer data are extracted."""
+        data = hci_packet((0x01, b"\x06"), (0x09, b"tzc"), (0xFF, b"\xc0\x74\x03\x39\x13\x9b"))
+
+        assert parse_hci_packet(data) == ("tzc", 0x74C0, b"\x03\x39\x13\x9b")
+
+    def test_other_device_dropped(self):
+        """Advertisements named other than the scale are skipped entirely."""
+        data = hci_packet((0x09, b"phone"), (0xFF, b"\x4c\x00\x02"))
+
+        assert parse_hci_packet(data) == (None, None, None)
+
+    def test_not_advertising_report(self):
+        """Other HCI events are ignored."""
+        data = bytearray(hci_packet((0x09, b"tzc")))
+        data[3] = 0x01
+
+        assert parse_hci_packet(bytes(data)) == (None, None, None)
+
+    def test_truncated_field(self):
+        """A field running past the advertising data stops parsing."""
+        data = hci_packet((0x09, b"tzc"))
+        data = data[:13] + bytes([data[13] + 1]) + data[14:] + b"\x09\xff"
+
+        assert parse_hci_packet(data) == ("tzc", None, None)
+
+
+@pytest.mark.usefixtures("temp_db")
+class TestRawPacketQueue:
+    """Tests for buffered raw packet writes."""
+
+    def test_queued_packets_flushed_together(self):
+        """Scale packets are queued by the callback and saved on flush."""
+        data = hci_packet((0x09, b"tzc"), (0xFF, b"\xc0\x74\x03\x39"))
+        scanner.process_hci_packet(data)
+        scanner.process_hci_packet(data)
+
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM raw_packets").fetchone()[0] == 0
+            scanner.flush_raw_packets()
+            rows = conn.execute("SELECT timestamp, mfg_id, data FROM raw_packets").fetchall()
+
+        assert scanner.raw_packet_queue.empty()
+        assert [(row["mfg_id"], row["data"]) for row in rows] == [(0x74C0, b"\x03\x39")] * 2
+        assert len(rows[0]["timestamp"]) == len("2024-01-01 08:00:00")
+
+    def test_failed_flush_retried(self, monkeypatch):
+        """Packets from a failed write stay queued and the loop keeps going."""
+        save = db.save_raw_packets_bulk
+        calls = []
+
+        def flaky_save(rows):
+            calls.append(len(rows))
+            if len(calls) == 1:
+                raise sqlite3.OperationalError("database is locked")
+            save(rows)
+
+        monkeypatch.setattr(db, "save_raw_packets_bulk", flaky_save)
+        monkeypatch.setattr(scanner, "FLUSH_INTERVAL_SECONDS", 0)
+        scanner.process_hci_packet(hci_packet((0x09, b"tzc"), (0xFF, b"\xc0\x74\x03\x39")))
+
+        async def run_briefly():
+            with pytest.raises(TimeoutError):
+                await asyncio.wait_for(scanner.flush_loop(), 0.05)
+
+        asyncio.run(run_briefly())
+
+        with db.get_connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM raw_packets").fetchone()[0] == 1
+        assert calls[:2] == [1, 1]
+        assert scanner.raw_packet_queue.empty()